@@ -1,9 +1,12 @@
 
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, session as flask_session
 from sqlalchemy import create_engine, text, MetaData, Table, Column, Integer, String, Float, Date, Text, Boolean, ForeignKey
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, DBAPIError
 import os
+import time
+import itertools
+import threading
 import logging
 
 # Настройка логирования
@@ -106,6 +109,124 @@ except Exception as e:
     logger.error(f"Database setup failed: {e}")
     raise
 
+# Read replicas (optional): comma-separated list of URLs.
+# GET list/form queries go to a healthy replica, all writes go to the primary.
+DATABASE_REPLICA_URLS = [u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+# How long after a user's own write their reads stay on the primary (read-your-writes).
+# Replicas lagging more than this are also taken out of rotation.
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+# How often the background thread checks replica connectivity and lag
+REPLICA_CHECK_SECONDS = float(os.environ.get('REPLICA_CHECK_SECONDS', 5))
+# Connect timeout for replicas, so an unreachable host can't hang a request or the checker
+REPLICA_CONNECT_TIMEOUT = int(os.environ.get('REPLICA_CONNECT_TIMEOUT', 3))
+
+# Recovery/streaming state and seconds the replica is behind (0 when it has replayed
+# everything it received). Lag is NULL when unknown, e.g. on a node not in recovery.
+# Without pg_read_all_stats the receiver status reads as NULL, so a running receiver counts.
+REPLICA_LAG_QUERY = """
+    SELECT pg_is_in_recovery() AS in_recovery,
+           EXISTS (SELECT 1 FROM pg_stat_wal_receiver
+                   WHERE COALESCE(status, 'streaming') = 'streaming') AS streaming,
+           CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END AS lag
+"""
+
+replica_engines = []
+# Replicas start out of rotation until the first background check passes
+replica_healthy = {}
+
+for replica_url in DATABASE_REPLICA_URLS:
+    # pool_pre_ping checks every pooled connection before handing it out
+    replica_engine = create_engine(replica_url, pool_pre_ping=True,
+                                   connect_args={'connect_timeout': REPLICA_CONNECT_TIMEOUT})
+    replica_engines.append(replica_engine)
+    replica_healthy[replica_engine] = False
+
+ReplicaSessions = {replica_engine: sessionmaker(bind=replica_engine) for replica_engine in replica_engines}
+_replica_cycle = itertools.cycle(replica_engines)
+
+def replica_name(replica_engine):
+    return replica_engine.url.render_as_string(hide_password=True)
+
+def check_replica(replica_engine):
+    """Live check of one replica: returns (ok, lag in seconds, error)"""
+    try:
+        with replica_engine.connect() as conn:
+            row = conn.execute(text(REPLICA_LAG_QUERY)).fetchone()
+    except Exception as e:
+        return False, None, str(e)
+    if not row.in_recovery:
+        return False, None, "not in recovery (standalone or promoted node)"
+    if not row.streaming:
+        return False, None, "WAL receiver is not streaming from the primary"
+    if row.lag is None:
+        return False, None, "replication lag is unknown"
+    lag = float(row.lag)
+    if lag > READ_YOUR_WRITES_SECONDS:
+        return False, lag, f"replication lag {lag:.1f}s exceeds {READ_YOUR_WRITES_SECONDS}s"
+    return True, lag, None
+
+def mark_replica_down(replica_engine, error):
+    if replica_healthy.get(replica_engine):
+        logger.warning(f"Replica {replica_name(replica_engine)} taken out of rotation: {error}")
+    replica_healthy[replica_engine] = False
+
+def _replica_checker():
+    # Runs outside the request path, so user requests never probe a down replica
+    while True:
+        for replica_engine in replica_engines:
+            ok, lag, error = check_replica(replica_engine)
+            if not ok:
+                mark_replica_down(replica_engine, error)
+            elif not replica_healthy[replica_engine]:
+                logger.info(f"Replica {replica_name(replica_engine)} in rotation (lag {lag:.1f}s)")
+                replica_healthy[replica_engine] = True
+        time.sleep(REPLICA_CHECK_SECONDS)
+
+if replica_engines:
+    threading.Thread(target=_replica_checker, name='replica-checker', daemon=True).start()
+
+def record_write():
+    """Remember the user's last write so their next reads go to the primary"""
+    flask_session['last_write_at'] = time.time()
+
+def pick_replica():
+    """Healthy replica for this user's reads, or None to read from the primary"""
+    last_write_at = flask_session.get('last_write_at')
+    if last_write_at and time.time() - last_write_at < READ_YOUR_WRITES_SECONDS:
+        return None
+    for _ in range(len(replica_engines)):
+        replica_engine = next(_replica_cycle)
+        if replica_healthy[replica_engine]:
+            return replica_engine
+    return None
+
+def _fetch_all(session, sql, params):
+    try:
+        return [dict(row._mapping) for row in session.execute(text(sql), params or {})]
+    finally:
+        session.close()
+
+def run_read(sql, params=None):
+    """Run a read-only query on a replica, falling back to the primary if the replica is unreachable"""
+    replica_engine = pick_replica()
+    if replica_engine is not None:
+        session = ReplicaSessions[replica_engine]()
+        connected = False
+        try:
+            session.connection()
+            connected = True
+            return _fetch_all(session, sql, params)
+        except DBAPIError as e:
+            # Only a failed connect or a dropped connection means the replica is gone.
+            # Timeouts, recovery conflicts and bad SQL go to the caller as on the primary.
+            if connected and not e.connection_invalidated:
+                raise
+            mark_replica_down(replica_engine, e)
+        finally:
+            session.close()
+    return _fetch_all(Session(), sql, params)
+
 # Table configurations
 TABLE_CONFIGS = {
     'users': {
@@ -283,31 +404,25 @@ TABLE_CONFIGS = {
 }
 
 def get_options_from_query(query):
-    session = Session()
-    try:
-        result = session.execute(text(query))
-        options = []
-        for row in result:
-            row_dict = dict(row._mapping)
-            if 'user_id' in row_dict:
-                label = f"{row_dict['user_id']} - {row_dict.get('given_name', '')} {row_dict.get('surname', '')}"
-                value = row_dict['user_id']
-            elif 'member_user_id' in row_dict:
-                label = str(row_dict['member_user_id'])
-                value = row_dict['member_user_id']
-            elif 'caregiver_user_id' in row_dict:
-                label = str(row_dict['caregiver_user_id'])
-                value = row_dict['caregiver_user_id']
-            elif 'job_id' in row_dict:
-                label = str(row_dict['job_id'])
-                value = row_dict['job_id']
-            else:
-                label = str(list(row_dict.values())[0])
-                value = list(row_dict.values())[0]
-            options.append({'value': value, 'label': label})
-        return options
-    finally:
-        session.close()
+    options = []
+    for row_dict in run_read(query):
+        if 'user_id' in row_dict:
+            label = f"{row_dict['user_id']} - {row_dict.get('given_name', '')} {row_dict.get('surname', '')}"
+            value = row_dict['user_id']
+        elif 'member_user_id' in row_dict:
+            label = str(row_dict['member_user_id'])
+            value = row_dict['member_user_id']
+        elif 'caregiver_user_id' in row_dict:
+            label = str(row_dict['caregiver_user_id'])
+            value = row_dict['caregiver_user_id']
+        elif 'job_id' in row_dict:
+            label = str(row_dict['job_id'])
+            value = row_dict['job_id']
+        else:
+            label = str(list(row_dict.values())[0])
+            value = list(row_dict.values())[0]
+        options.append({'value': value, 'label': label})
+    return options
 
 @app.route('/')
 def index():
@@ -329,7 +444,8 @@ def db_test():
         db_info = {
             'status': 'Connected',
             'test_result': row[0],
-            'database_url': DATABASE_URL.replace(DATABASE_URL.split('@')[0] if '@' in DATABASE_URL else DATABASE_URL, '***:***@')
+            'database_url': DATABASE_URL.replace(DATABASE_URL.split('@')[0] if '@' in DATABASE_URL else DATABASE_URL, '***:***@'),
+            'replicas': {replica_name(e): dict(zip(('ok', 'lag', 'error'), check_replica(e))) for e in replica_engines}
         }
 
         return f"""
@@ -461,10 +577,8 @@ def create_crud_routes(table_name, config):
         table_display_name += 's'
     
     def list_view():
-        session = Session()
         try:
-            result = session.execute(text(config['list_query']))
-            rows = [dict(row._mapping) for row in result]
+            rows = run_read(config['list_query'])
             # Handle composite key for job_applications
             if table_name == 'job_applications':
                 return render_template('list.html',
@@ -496,8 +610,6 @@ def create_crud_routes(table_name, config):
         except Exception as e:
             logger.error(f"Unexpected error in {table_name} list: {e}")
             return "Internal Server Error", 500
-        finally:
-            session.close()
     
     list_view.__name__ = list_func_name
     app.add_url_rule(f'/{table_name}', view_func=list_view, endpoint=list_func_name)
@@ -523,6 +635,7 @@ def create_crud_routes(table_name, config):
                 field_names = ', '.join(fields)
                 session.execute(text(f"INSERT INTO {config['table']} ({field_names}) VALUES ({placeholders})"), values)
                 session.commit()
+                record_write()
                 flash(f'{table_display_name} created successfully!', 'success')
                 return redirect(url_for(list_func_name))
             except Exception as e:
@@ -563,16 +676,16 @@ def create_crud_routes(table_name, config):
                     set_clause = ', '.join([f'{f} = :{f}' for f in update_fields])
                     session.execute(text(f"UPDATE {config['table']} SET {set_clause} WHERE {id_field} = :{id_field}"), values)
                     session.commit()
+                    record_write()
                     flash(f'{table_display_name} updated successfully!', 'success')
                     return redirect(url_for(list_func_name))
                 
-                result = session.execute(text(f"SELECT * FROM {config['table']} WHERE {id_field} = :id"), {'id': record_id})
-                row = result.fetchone()
-                if not row:
+                rows = run_read(f"SELECT * FROM {config['table']} WHERE {id_field} = :id", {'id': record_id})
+                if not rows:
                     flash('Record not found', 'error')
                     return redirect(url_for(list_func_name))
                 
-                row_dict = dict(row._mapping)
+                row_dict = rows[0]
                 fields = []
                 for field in config['create_fields']:
                     if field['name'] in config['update_fields']:
@@ -600,6 +713,7 @@ def create_crud_routes(table_name, config):
                 record_id = kwargs.get(id_field) or request.view_args.get(id_field)
                 session.execute(text(f"DELETE FROM {config['table']} WHERE {id_field} = :id"), {'id': record_id})
                 session.commit()
+                record_write()
                 flash(f'{table_display_name} deleted successfully!', 'success')
             except Exception as e:
                 session.rollback()
@@ -620,6 +734,7 @@ def create_crud_routes(table_name, config):
                 session.execute(text(f"DELETE FROM {config['table']} WHERE caregiver_user_id = :c AND job_id = :j"),
                               {'c': caregiver_id, 'j': job_id})
                 session.commit()
+                record_write()
                 flash(f'{table_display_name} deleted successfully!', 'success')
             except Exception as e:
                 session.rollback()